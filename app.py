@@ -2,105 +2,89 @@ import sqlite3
 from datetime import date, datetime, timedelta
 from pathlib import Path
 import os
+import base64
 import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
-import pandas as pd
 import streamlit as st
-try:
-    import psycopg
-except Exception:
-    psycopg = None
-try:
-    import psycopg2
-except Exception:
-    psycopg2 = None
 
-st.set_page_config(page_title="Old School Rezervasyon", layout="wide")
-st.markdown(
-    """
-    <style>
-    .pc-legend-chip {
-      display:inline-block;
-      padding:4px 10px;
-      border-radius:999px;
-      font-size:12px;
-      font-weight:700;
-      margin-right:8px;
-      margin-bottom:6px;
-      border:1px solid transparent;
-    }
-    .pc-free { background:#ecfdf5; color:#065f46; border-color:#a7f3d0; }
-    .pc-used { background:#fef2f2; color:#991b1b; border-color:#fecaca; }
-    .pc-picked { background:#eff6ff; color:#1e3a8a; border-color:#bfdbfe; }
-    .pc-area-title {
-      font-weight:800;
-      font-size:15px;
-      margin-bottom:2px;
-    }
-    .pc-area-sub {
-      color:#4b5563;
-      font-size:12px;
-      margin-bottom:8px;
-    }
-    .pc-grid div[data-testid="stCheckbox"] {
-      margin-bottom: 0.18rem;
-    }
-    .pc-grid div[data-testid="stCheckbox"] label {
-      width: 100%;
-      border-radius: 10px;
-      border: 1px solid #a7f3d0;
-      background: #ecfdf5;
-      padding: 8px 6px;
-      display: flex;
-      justify-content: center;
-      align-items: center;
-      transition: all 0.15s ease;
-      min-height: 44px;
-      cursor: pointer;
-    }
-    .pc-grid div[data-testid="stCheckbox"] label:hover {
-      transform: translateY(-1px);
-      box-shadow: 0 2px 10px rgba(0,0,0,0.06);
-    }
-    .pc-grid div[data-testid="stCheckbox"] label p {
-      margin: 0;
-      width: 100%;
-      text-align: center;
-      font-weight: 700;
-      font-size: 12px;
-      color: #065f46;
-    }
-    .pc-grid div[data-testid="stCheckbox"]:has(input:checked) label {
-      background: #eff6ff;
-      border-color: #93c5fd;
-    }
-    .pc-grid div[data-testid="stCheckbox"]:has(input:checked) label p {
-      color: #1e3a8a;
-    }
-    .pc-grid div[data-testid="stCheckbox"]:has(input:disabled) label {
-      background: #fef2f2;
-      border-color: #fecaca;
-      cursor: not-allowed;
-      opacity: 0.95;
-    }
-    .pc-grid div[data-testid="stCheckbox"]:has(input:disabled) label p {
-      color: #991b1b;
-      text-decoration: line-through;
-    }
-    .pc-grid div[data-testid="stCheckbox"] input[type="checkbox"] {
-      display: none;
+if TYPE_CHECKING:
+    import pandas as pd
+
+APP_DIR = Path(__file__).resolve().parent
+
+
+@st.cache_resource(show_spinner=False)
+def load_settings() -> dict[str, str]:
+    # st.secrets is parsed once here; without a secrets.toml, environment variables are used.
+    try:
+        configured = dict(st.secrets)
+    except FileNotFoundError:
+        configured = {}
+
+    def setting(key: str, default: str = "") -> str:
+        return str(configured.get(key, os.getenv(key, default)))
+
+    return {
+        "DATABASE_URL": setting("DATABASE_URL").strip(),
+        "DATABASE_READ_URL": setting("DATABASE_READ_URL").strip(),
+        "APP_USER": setting("APP_USER", "admin").strip(),
+        "APP_PASSWORD": setting("APP_PASSWORD", "123456"),
+        "SESSION_SECRET": setting("SESSION_SECRET").strip(),
     }
-    </style>
-    """,
-    unsafe_allow_html=True,
-)
+
+
+@st.cache_resource(show_spinner=False)
+def load_css() -> str:
+    return (APP_DIR / "assets" / "app.css").read_text(encoding="utf-8")
+
+
+st.set_page_config(page_title="Old School Rezervasyon", layout="wide")
+st.markdown(f"<style>\n{load_css()}</style>", unsafe_allow_html=True)
+
+SETTINGS = load_settings()
 
 DB_PATH = Path("oldschool_reservation.db")
-DATABASE_URL = str(st.secrets.get("DATABASE_URL", os.getenv("DATABASE_URL", ""))).strip()
-APP_USER = str(st.secrets.get("APP_USER", os.getenv("APP_USER", "admin"))).strip()
-APP_PASSWORD = str(st.secrets.get("APP_PASSWORD", os.getenv("APP_PASSWORD", "123456")))
+DATABASE_URL = SETTINGS["DATABASE_URL"]
+DATABASE_READ_URL = SETTINGS["DATABASE_READ_URL"]
+# After a write, this session keeps reading from the primary until the replica has caught up.
+READ_YOUR_WRITES_SECONDS = 10
+# Tables and columns queried through DBConn.read; a replica lacking any of them is not used.
+REPLICA_SCHEMA = {
+    "branch": "id, code, name",
+    "area": "id, branch_id, code, name, sort_order",
+    "pc": "id, area_id, label, sort_order",
+    "customer": "id, branch_id, name, name_norm, phone, phone_norm",
+    "reservation": (
+        "id, branch_id, d, start_time, end_time, customer_name, phone, people_count, table_no, status, note, "
+        "created_by, version, customer_id"
+    ),
+    "app_user": "username, role, created_at",
+}
+APP_USER = SETTINGS["APP_USER"]
+APP_PASSWORD = SETTINGS["APP_PASSWORD"]
+# scrypt cost: ~16 MB and a few tens of ms per hash; at most LOGIN_WORKERS hashes run at once per process.
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2**14, 8, 1
+LOGIN_WORKERS = 4
+LOGIN_MAX_FAILURES = 5
+LOGIN_WINDOW_SECONDS = 300
+# Upper bound on usernames tracked for rate limiting; any name can be submitted, so the map must stay bounded.
+LOGIN_TRACKED_USERS_MAX = 10_000
+SESSION_QUERY_PARAM = "session"
+SESSION_TTL_SECONDS = 12 * 3600
+# How often each process reloads token epochs/roles written by other processes.
+USER_TOKEN_RELOAD_SECONDS = 60
 UNKNOWN_END_LABEL = "belirsiz"
-AREA_LAYOUT = [
+DEFAULT_BRANCH_CODE = "MERKEZ"
+DEFAULT_BRANCH_NAME = "Merkez"
+# Seed layout for the default branch; live layouts are stored in branch/area/pc tables.
+DEFAULT_AREA_LAYOUT = [
     ("Yellow Area", "Y", 32),
     ("EF Area", "EF", 10),
     ("Red Area", "R", 10),
@@ -110,59 +94,504 @@ AREA_LAYOUT = [
 
 
 class DBConn:
-    def __init__(self, driver: str, raw_conn):
+    def __init__(self, driver: str, raw_conn, read_driver: str | None = None, read_conn=None, session=None):
         self.driver = driver
         self._conn = raw_conn
-
-    def _sql(self, q: str) -> str:
-        if self.driver == "postgres":
+        self.read_driver = read_driver or driver
+        self._read_conn = read_conn
+        # Set by get_conn when DATABASE_READ_URL is configured but unusable; reads then use the primary.
+        self.read_error: str | None = None
+        # Mapping that survives reruns (st.session_state); remembers this session's last write.
+        self._session = session if session is not None else {}
+        # True between the first write statement and commit()/rollback().
+        self._in_write = False
+
+    @staticmethod
+    def _sql_for(driver: str, q: str) -> str:
+        if driver == "postgres":
             return q.replace("?", "%s")
         return q
 
+    def _sql(self, q: str) -> str:
+        return self._sql_for(self.driver, q)
+
     def execute(self, q: str, params=()):
         cur = self._conn.cursor()
-        cur.execute(self._sql(q), tuple(params))
+        try:
+            cur.execute(self._sql(q), tuple(params))
+        except Exception:
+            # A failed statement aborts the transaction on Postgres; reset it so the
+            # long-lived session connection stays usable.
+            self.rollback()
+            raise
+        if q.lstrip().upper().startswith(("SELECT", "PRAGMA")):
+            if self.driver == "postgres" and not self._in_write:
+                # Rows are already fetched client-side; end the implicit read transaction
+                # instead of leaving the connection idle in transaction.
+                self._conn.commit()
+        else:
+            self._in_write = True
+        return cur
+
+    def insert(self, q: str, params=()) -> int:
+        # INSERT and return the new row id on both backends.
+        if self.driver == "postgres":
+            return int(self.execute(q + " RETURNING id", params).fetchone()[0])
+        return int(self.execute(q, params).lastrowid)
+
+    def reads_primary(self) -> bool:
+        return self._read_conn is None or self.recently_wrote()
+
+    def read(self, q: str, params=()):
+        # List/search/stats queries; goes to the replica unless this session wrote recently.
+        if self.reads_primary():
+            return self.execute(q, params)
+        try:
+            cur = self._read_conn.cursor()
+            cur.execute(self._sql_for(self.read_driver, q), tuple(params))
+        except Exception as exc:
+            # Replica dropped or lost part of the schema: this connection reads from the primary from now on.
+            self.read_error = str(exc)
+            try:
+                self._read_conn.close()
+            except Exception:
+                pass
+            self._read_conn = None
+            return self.execute(q, params)
         return cur
 
+    def recently_wrote(self) -> bool:
+        last = float(self._session.get("db_last_write_at", 0.0))
+        return time.time() - last < READ_YOUR_WRITES_SECONDS
+
     def commit(self):
         self._conn.commit()
+        self._in_write = False
+        self.stick_to_primary()
+
+    def stick_to_primary(self):
+        self._session["db_last_write_at"] = time.time()
+
+    def rollback(self):
+        try:
+            self._conn.rollback()
+        except Exception:
+            pass
+        self._in_write = False
+
+    @property
+    def closed(self) -> bool:
+        # psycopg exposes .closed; sqlite3 connections have no such flag and do not drop.
+        return bool(getattr(self._conn, "closed", False))
 
     def close(self):
         self._conn.close()
+        if self._read_conn is not None:
+            self._read_conn.close()
 
 
-def get_conn():
-    if DATABASE_URL:
-        if psycopg is not None:
-            if "sslmode=" in DATABASE_URL:
-                raw = psycopg.connect(DATABASE_URL)
-            else:
-                raw = psycopg.connect(DATABASE_URL, sslmode="require")
-        elif psycopg2 is not None:
-            if "sslmode=" in DATABASE_URL:
-                raw = psycopg2.connect(DATABASE_URL)
-            else:
-                raw = psycopg2.connect(DATABASE_URL, sslmode="require")
+@st.cache_resource(show_spinner=False)
+def load_pg_driver():
+    # Only imported when a Postgres URL is configured; psycopg 3 is preferred over psycopg2.
+    try:
+        import psycopg
+
+        return psycopg
+    except Exception:
+        pass
+    try:
+        import psycopg2
+
+        return psycopg2
+    except Exception:
+        return None
+
+
+def connect_url(url: str, read_only: bool = False):
+    if url.startswith("sqlite:///"):
+        path = url[len("sqlite:///"):]
+        if read_only:
+            raw = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
         else:
-            raise RuntimeError("Postgres driver bulunamadi. requirements'e psycopg[binary] veya psycopg2-binary ekleyin.")
-        raw.autocommit = False
-        return DBConn("postgres", raw)
+            raw = sqlite3.connect(path, check_same_thread=False)
+            raw.execute("PRAGMA foreign_keys = ON;")
+        return "sqlite", raw
+
+    pg = load_pg_driver()
+    if pg is None:
+        raise RuntimeError("Postgres driver bulunamadi. requirements'e psycopg[binary] veya psycopg2-binary ekleyin.")
+    if "sslmode=" in url:
+        raw = pg.connect(url)
+    else:
+        raw = pg.connect(url, sslmode="require")
+    # Replica reads run outside a long transaction so every query sees the latest replicated state.
+    raw.autocommit = read_only
+    return "postgres", raw
+
 
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.execute("PRAGMA foreign_keys = ON;")
-    return DBConn("sqlite", conn)
+def get_conn(session=None, read: bool = True):
+    driver, raw = connect_url(DATABASE_URL or f"sqlite:///{DB_PATH}")
+    if not (read and DATABASE_READ_URL):
+        return DBConn(driver, raw, session=session)
+
+    read_driver, read_raw, read_error = None, None, None
+    try:
+        read_driver, read_raw = connect_url(DATABASE_READ_URL, read_only=True)
+        # A replica without the current schema (never copied, or copied before a migration) is as unusable
+        # as a missing one.
+        for table, columns in REPLICA_SCHEMA.items():
+            read_raw.cursor().execute(f"SELECT {columns} FROM {table} LIMIT 0")
+    except Exception as exc:
+        if read_raw is not None:
+            read_raw.close()
+        read_driver, read_raw, read_error = None, None, str(exc)
+    conn = DBConn(driver, raw, read_driver=read_driver, read_conn=read_raw, session=session)
+    conn.read_error = read_error
+    return conn
 
 
 def hash_password(raw: str) -> str:
-    return hashlib.sha256(str(raw).encode("utf-8")).hexdigest()
+    salt = secrets.token_bytes(16)
+    digest = hashlib.scrypt(str(raw).encode("utf-8"), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(raw: str, stored: str) -> bool:
+    stored = str(stored)
+    if stored.startswith("scrypt$"):
+        try:
+            _, n, r, p, salt_hex, digest_hex = stored.split("$")
+            digest = hashlib.scrypt(
+                str(raw).encode("utf-8"), salt=bytes.fromhex(salt_hex), n=int(n), r=int(r), p=int(p)
+            )
+        except ValueError:
+            return False
+        return hmac.compare_digest(digest.hex(), digest_hex)
+    # Legacy unsalted SHA-256; check_login re-hashes it after a successful login.
+    legacy = hashlib.sha256(str(raw).encode("utf-8")).hexdigest()
+    return hmac.compare_digest(legacy, stored)
+
+
+def password_needs_rehash(stored: str) -> bool:
+    return not str(stored).startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+
+@st.cache_resource(show_spinner=False)
+def login_pool() -> ThreadPoolExecutor:
+    # Bounded concurrency, not offloading: callers wait on .result(), so the submitting script thread still
+    # blocks for the hash, but a burst of logins cannot take every CPU away from booking traffic.
+    return ThreadPoolExecutor(max_workers=LOGIN_WORKERS, thread_name_prefix="login")
+
+
+@st.cache_resource(show_spinner=False)
+def dummy_password_hash() -> str:
+    # Verified for unknown usernames so they cost the same scrypt run as real ones.
+    return hash_password(secrets.token_hex(16))
+
+
+@st.cache_resource(show_spinner=False)
+def login_failures() -> tuple[threading.Lock, dict[str, list[float]]]:
+    return threading.Lock(), {}
+
+
+def login_blocked_seconds(username: str) -> int:
+    lock, failures = login_failures()
+    now = time.time()
+    with lock:
+        recent = [t for t in failures.get(username, []) if now - t < LOGIN_WINDOW_SECONDS]
+        if not recent:
+            failures.pop(username, None)
+            return 0
+        failures[username] = recent
+        if len(recent) < LOGIN_MAX_FAILURES:
+            return 0
+        return int(LOGIN_WINDOW_SECONDS - (now - recent[0])) + 1
+
+
+def record_login_failure(username: str):
+    lock, failures = login_failures()
+    now = time.time()
+    with lock:
+        for name in [n for n, ts in failures.items() if now - ts[-1] >= LOGIN_WINDOW_SECONDS]:
+            del failures[name]
+        if username not in failures and len(failures) >= LOGIN_TRACKED_USERS_MAX:
+            del failures[min(failures, key=lambda n: failures[n][-1])]
+        recent = [t for t in failures.get(username, []) if now - t < LOGIN_WINDOW_SECONDS]
+        recent.append(now)
+        # Only the last LOGIN_MAX_FAILURES timestamps matter for the block decision.
+        failures[username] = recent[-LOGIN_MAX_FAILURES:]
+
+
+def clear_login_failures(username: str):
+    lock, failures = login_failures()
+    with lock:
+        failures.pop(username, None)
+
+
+@st.cache_resource(show_spinner=False)
+def load_session_secret(_conn) -> bytes:
+    # SESSION_SECRET wins; otherwise a random key generated once and stored in app_setting is used,
+    # so tokens keep working across restarts and across processes sharing the database.
+    if SETTINGS["SESSION_SECRET"]:
+        return SETTINGS["SESSION_SECRET"].encode("utf-8")
+    row = _conn.execute("SELECT value FROM app_setting WHERE key=?", ("session_secret",)).fetchone()
+    return str(row[0]).encode("utf-8")
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+@st.cache_resource(show_spinner=False, ttl=USER_TOKEN_RELOAD_SECONDS)
+def load_user_tokens(_conn) -> tuple[threading.Lock, dict[str, tuple[int, str]]]:
+    # username -> (token_epoch, role), loaded with one query per process and reload window, never per request.
+    # This process applies its own revocations in place; role changes, deletions and other processes' revocations
+    # arrive with the reload.
+    rows = _conn.execute("SELECT username, token_epoch, role FROM app_user").fetchall()
+    return threading.Lock(), {str(u): (int(e), str(r).lower()) for u, e, r in rows}
+
+
+def user_token_state(conn: DBConn, username: str) -> tuple[int, str] | None:
+    lock, users = load_user_tokens(conn)
+    with lock:
+        return users.get(username)
+
+
+def set_user_token_state(conn: DBConn, username: str, epoch: int, role: str):
+    lock, users = load_user_tokens(conn)
+    with lock:
+        users[username] = (int(epoch), str(role).lower())
+
+
+def revoke_user_tokens(conn: DBConn, username: str):
+    # Bumping the epoch invalidates every token issued to the user, including copies left in browser history.
+    conn.execute("UPDATE app_user SET token_epoch=token_epoch+1 WHERE username=?", (username,))
+    row = conn.execute("SELECT token_epoch, role FROM app_user WHERE username=?", (username,)).fetchone()
+    conn.commit()
+    if row:
+        set_user_token_state(conn, username, int(row[0]), str(row[1]))
+
+
+@st.cache_resource(show_spinner=False, ttl=USER_TOKEN_RELOAD_SECONDS)
+def load_revoked_tokens(_conn) -> tuple[threading.Lock, set[str]]:
+    # Ids of logged-out tokens that have not expired yet; reloaded on the same schedule as load_user_tokens.
+    rows = _conn.execute("SELECT token_id FROM revoked_token WHERE expires_at > ?", (int(time.time()),)).fetchall()
+    return threading.Lock(), {str(r[0]) for r in rows}
+
+
+def token_revoked(conn: DBConn, token_id: str | None) -> bool:
+    lock, revoked = load_revoked_tokens(conn)
+    with lock:
+        return token_id in revoked
+
+
+def revoke_session_token(conn: DBConn, token_id: str | None, expires_at: int | None):
+    # Ends one login (this tab, tabs opened from its URL and the URL in browser history); other devices stay in.
+    if not token_id:
+        return
+    now = int(time.time())
+    conn.execute("DELETE FROM revoked_token WHERE expires_at <= ?", (now,))
+    conn.execute(
+        "INSERT INTO revoked_token(token_id, expires_at) VALUES(?,?) ON CONFLICT DO NOTHING",
+        (str(token_id), int(expires_at or now + SESSION_TTL_SECONDS)),
+    )
+    conn.commit()
+    lock, revoked = load_revoked_tokens(conn)
+    with lock:
+        revoked.add(str(token_id))
+
+
+def issue_session_token(secret: bytes, username: str, epoch: int, token_id: str, expires_at: int) -> str:
+    claims = {"u": username, "e": int(epoch), "j": token_id, "exp": int(expires_at)}
+    payload = _b64(json.dumps(claims).encode("utf-8"))
+    sig = _b64(hmac.new(secret, payload.encode("ascii"), hashlib.sha256).digest())
+    return f"{payload}.{sig}"
+
+
+def verify_session_token(secret: bytes, token: str) -> dict | None:
+    # The token comes straight from the URL: anything malformed is rejected, never raised.
+    payload, _, sig = str(token).partition(".")
+    try:
+        expected = _b64(hmac.new(secret, payload.encode("ascii"), hashlib.sha256).digest())
+        if not sig or not hmac.compare_digest(sig.encode("ascii"), expected.encode("ascii")):
+            return None
+        claims = json.loads(_unb64(payload))
+        if not isinstance(claims, dict) or int(claims.get("exp", 0)) < time.time():
+            return None
+        if not isinstance(claims.get("j"), str):
+            return None
+    except (ValueError, TypeError):
+        return None
+    return claims
+
+
+def table_has_column(conn: DBConn, table: str, column: str) -> bool:
+    if conn.driver == "postgres":
+        row = conn.execute(
+            """
+            SELECT 1
+            FROM information_schema.columns
+            WHERE table_schema = 'public'
+              AND table_name = ?
+              AND column_name = ?
+            """,
+            (table, column),
+        ).fetchone()
+        return row is not None
+    cols = conn.execute(f"PRAGMA table_info({table});").fetchall()
+    return any(str(c[1]).lower() == column for c in cols)
+
+
+def create_area(conn: DBConn, branch_id: int, area_name: str, area_code: str, pc_count: int, sort_order: int):
+    conn.execute(
+        "INSERT INTO area(branch_id, code, name, sort_order) VALUES(?,?,?,?)",
+        (int(branch_id), area_code, area_name, int(sort_order)),
+    )
+    area_id = conn.execute(
+        "SELECT id FROM area WHERE branch_id=? AND code=?",
+        (int(branch_id), area_code),
+    ).fetchone()[0]
+    for i in range(1, int(pc_count) + 1):
+        conn.execute(
+            "INSERT INTO pc(branch_id, area_id, label, sort_order) VALUES(?,?,?,?)",
+            (int(branch_id), int(area_id), f"{area_code}-{i:02d}", i),
+        )
+    return int(area_id)
+
+
+TR_FOLD = str.maketrans("çğıöşüÇĞİÖŞÜ", "cgiosuCGIOSU")
+
+
+def normalize_phone(raw: str | None) -> str:
+    # National significant number: "+90 (555) 123 45 67", "0555..." and "555..." all map to "5551234567".
+    digits = "".join(ch for ch in str(raw or "") if ch.isdigit())
+    digits = digits.lstrip("0")
+    if digits.startswith("90"):
+        digits = digits[2:].lstrip("0")
+    return digits
+
+
+def normalize_name(raw: str | None) -> str:
+    return " ".join(str(raw or "").translate(TR_FOLD).lower().split())
+
+
+def prefix_range(prefix: str) -> tuple[str, str]:
+    # "abc" -> ("abc", "abd"): BETWEEN-style bounds that both SQLite and Postgres serve from a b-tree index.
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def find_or_create_customer(conn: DBConn, branch_id: int, name: str, phone: str | None) -> int | None:
+    name_norm = normalize_name(name)
+    phone_norm = normalize_phone(phone)
+    if not name_norm and not phone_norm:
+        return None
+
+    def lookup():
+        # Phone identifies a customer; without a phone, the normalized name is used.
+        if phone_norm:
+            return conn.execute(
+                "SELECT id FROM customer WHERE branch_id=? AND phone_norm=?",
+                (int(branch_id), phone_norm),
+            ).fetchone()
+        return conn.execute(
+            "SELECT id FROM customer WHERE branch_id=? AND phone_norm='' AND name_norm=?",
+            (int(branch_id), name_norm),
+        ).fetchone()
+
+    row = lookup()
+    if row is None:
+        # A concurrent booking may insert the same customer first; the unique indexes turn that into a no-op.
+        conn.execute(
+            "INSERT INTO customer(branch_id, name, name_norm, phone, phone_norm, created_at) VALUES(?,?,?,?,?,?) "
+            "ON CONFLICT DO NOTHING",
+            (
+                int(branch_id),
+                str(name).strip(),
+                name_norm,
+                str(phone).strip() if phone_norm else None,
+                phone_norm,
+                datetime.now().isoformat(timespec="seconds"),
+            ),
+        )
+        row = lookup()
+    return int(row[0])
 
 
 def init_db(conn: DBConn):
     id_col = "BIGSERIAL PRIMARY KEY" if conn.driver == "postgres" else "INTEGER PRIMARY KEY AUTOINCREMENT"
+    ref_col = "BIGINT" if conn.driver == "postgres" else "INTEGER"
+    # Byte-order collation keeps prefix range scans exact on Postgres; SQLite already compares bytes.
+    norm_col = 'TEXT COLLATE "C"' if conn.driver == "postgres" else "TEXT"
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS branch (
+            id {id_col},
+            code TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS area (
+            id {id_col},
+            branch_id {ref_col} NOT NULL REFERENCES branch(id),
+            code TEXT NOT NULL,
+            name TEXT NOT NULL,
+            sort_order INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (branch_id, code)
+        );
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS pc (
+            id {id_col},
+            branch_id {ref_col} NOT NULL REFERENCES branch(id),
+            area_id {ref_col} NOT NULL REFERENCES area(id),
+            label TEXT NOT NULL,
+            sort_order INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (branch_id, label)
+        );
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pc_area ON pc(area_id);")
+
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS customer (
+            id {id_col},
+            branch_id {ref_col} NOT NULL REFERENCES branch(id),
+            name TEXT NOT NULL,
+            name_norm {norm_col} NOT NULL,
+            phone TEXT,
+            phone_norm {norm_col} NOT NULL DEFAULT '',
+            created_at TEXT NOT NULL
+        );
+        """
+    )
+    # Prefix search runs as a range scan on these b-tree indexes (see prefix_range).
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customer_branch_phone ON customer(branch_id, phone_norm);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customer_branch_name ON customer(branch_id, name_norm);")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_customer_branch_phone ON customer(branch_id, phone_norm) "
+        "WHERE phone_norm != '';"
+    )
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_customer_branch_name_nophone ON customer(branch_id, name_norm) "
+        "WHERE phone_norm = '';"
+    )
+
     conn.execute(
         f"""
         CREATE TABLE IF NOT EXISTS reservation (
             id {id_col},
+            branch_id {ref_col} REFERENCES branch(id),
             d TEXT NOT NULL,
             start_time TEXT NOT NULL,
             end_time TEXT NOT NULL,
@@ -173,12 +602,26 @@ def init_db(conn: DBConn):
             status TEXT NOT NULL DEFAULT 'onayli',
             note TEXT,
             created_at TEXT NOT NULL,
-            created_by TEXT
+            created_by TEXT,
+            version INTEGER NOT NULL DEFAULT 1,
+            customer_id {ref_col} REFERENCES customer(id)
         );
         """
     )
     conn.execute("CREATE INDEX IF NOT EXISTS idx_reservation_d ON reservation(d);")
 
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS reservation_pc (
+            reservation_id {ref_col} NOT NULL REFERENCES reservation(id) ON DELETE CASCADE,
+            pc_id {ref_col} NOT NULL REFERENCES pc(id),
+            branch_id {ref_col} NOT NULL REFERENCES branch(id),
+            PRIMARY KEY (reservation_id, pc_id)
+        );
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reservation_pc_branch_pc ON reservation_pc(branch_id, pc_id);")
+
     conn.execute(
         f"""
         CREATE TABLE IF NOT EXISTS app_user (
@@ -186,29 +629,77 @@ def init_db(conn: DBConn):
             username TEXT NOT NULL UNIQUE,
             password_hash TEXT NOT NULL,
             role TEXT NOT NULL DEFAULT 'user',
-            created_at TEXT NOT NULL
+            created_at TEXT NOT NULL,
+            token_epoch INTEGER NOT NULL DEFAULT 0
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS revoked_token (
+            token_id TEXT PRIMARY KEY,
+            expires_at INTEGER NOT NULL
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS app_setting (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
         );
         """
     )
 
-    has_created_by = False
-    if conn.driver == "postgres":
-        row = conn.execute(
-            """
-            SELECT 1
-            FROM information_schema.columns
-            WHERE table_schema = 'public'
-              AND table_name = 'reservation'
-              AND column_name = 'created_by'
-            """
-        ).fetchone()
-        has_created_by = row is not None
-    else:
-        cols = conn.execute("PRAGMA table_info(reservation);").fetchall()
-        has_created_by = any(str(c[1]).lower() == "created_by" for c in cols)
-
-    if not has_created_by:
+    if not table_has_column(conn, "app_user", "token_epoch"):
+        conn.execute("ALTER TABLE app_user ADD COLUMN token_epoch INTEGER NOT NULL DEFAULT 0;")
+    if not table_has_column(conn, "reservation", "created_by"):
         conn.execute("ALTER TABLE reservation ADD COLUMN created_by TEXT;")
+    if not table_has_column(conn, "reservation", "version"):
+        conn.execute("ALTER TABLE reservation ADD COLUMN version INTEGER NOT NULL DEFAULT 1;")
+    if not table_has_column(conn, "reservation", "branch_id"):
+        conn.execute(f"ALTER TABLE reservation ADD COLUMN branch_id {ref_col} REFERENCES branch(id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reservation_branch_d ON reservation(branch_id, d);")
+    if not table_has_column(conn, "reservation", "customer_id"):
+        conn.execute(f"ALTER TABLE reservation ADD COLUMN customer_id {ref_col} REFERENCES customer(id);")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reservation_branch_customer ON reservation(branch_id, customer_id, d);"
+    )
+
+    default_branch = conn.execute("SELECT id FROM branch WHERE code=?", (DEFAULT_BRANCH_CODE,)).fetchone()
+    if not default_branch:
+        conn.execute(
+            "INSERT INTO branch(code, name, created_at) VALUES(?,?,?)",
+            (DEFAULT_BRANCH_CODE, DEFAULT_BRANCH_NAME, datetime.now().isoformat(timespec="seconds")),
+        )
+        default_branch = conn.execute("SELECT id FROM branch WHERE code=?", (DEFAULT_BRANCH_CODE,)).fetchone()
+        for order, (area_name, area_code, count) in enumerate(DEFAULT_AREA_LAYOUT):
+            create_area(conn, int(default_branch[0]), area_name, area_code, count, order)
+    # Rows created before branches existed belong to the default branch.
+    conn.execute("UPDATE reservation SET branch_id=? WHERE branch_id IS NULL", (int(default_branch[0]),))
+
+    # Rows written before reservation_pc existed: map their table_no labels to pc ids once.
+    pc_rows = conn.execute("SELECT id, branch_id, label FROM pc").fetchall()
+    pc_by_label = {(int(b), str(label)): int(pc_id) for pc_id, b, label in pc_rows}
+    unmapped = conn.execute(
+        """
+        SELECT r.id, r.branch_id, r.table_no
+        FROM reservation r
+        WHERE r.table_no IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM reservation_pc rp WHERE rp.reservation_id = r.id)
+        """
+    ).fetchall()
+    for rid, r_branch, r_pcs in unmapped:
+        keys = [(int(r_branch), p) for p in normalize_pc_list(r_pcs)]
+        pc_ids = [pc_by_label[k] for k in keys if k in pc_by_label]
+        set_reservation_pcs(conn, int(r_branch), int(rid), pc_ids)
+
+    unlinked = conn.execute(
+        "SELECT id, branch_id, customer_name, phone FROM reservation WHERE customer_id IS NULL"
+    ).fetchall()
+    for rid, r_branch, r_name, r_phone in unlinked:
+        customer_id = find_or_create_customer(conn, int(r_branch), str(r_name), r_phone)
+        conn.execute("UPDATE reservation SET customer_id=? WHERE id=?", (customer_id, int(rid)))
 
     admin_exists = conn.execute("SELECT id FROM app_user WHERE username=?", (APP_USER,)).fetchone()
     if not admin_exists:
@@ -221,22 +712,187 @@ def init_db(conn: DBConn):
                 datetime.now().isoformat(timespec="seconds"),
             ),
         )
+    if not conn.execute("SELECT key FROM app_setting WHERE key=?", ("session_secret",)).fetchone():
+        conn.execute("INSERT INTO app_setting(key, value) VALUES(?,?)", ("session_secret", secrets.token_hex(32)))
     conn.commit()
 
 
-def df_query(conn, q, params=()):
-    cur = conn.execute(q, params)
+def df_from_cursor(cur):
+    import pandas as pd
+
     rows = cur.fetchall()
     cols = [c[0] for c in cur.description] if cur.description else []
     return pd.DataFrame(rows, columns=cols)
 
 
+def df_query(conn, q, params=()):
+    return df_from_cursor(conn.execute(q, params))
+
+
+@st.cache_resource(show_spinner=False)
+def data_revisions() -> tuple[threading.Lock, dict[str, int]]:
+    # Process-wide write counters; st.cache_data entries are shared by every session, so their keys must be too.
+    return threading.Lock(), {}
+
+
+def data_rev(conn: DBConn, kind: str = "db") -> tuple[int, bool]:
+    # Cache key for shared query results. Replica and primary results are kept apart, so a session that just
+    # wrote never reads a lagging replica snapshot cached by another session under the same counter.
+    lock, revs = data_revisions()
+    with lock:
+        return revs.get(kind, 0), conn.reads_primary()
+
+
+def bump_data_rev(kind: str = "db"):
+    lock, revs = data_revisions()
+    with lock:
+        revs[kind] = revs.get(kind, 0) + 1
+
+
 @st.cache_data(show_spinner=False, ttl=60)
-def df_query_cached(_conn, q, params=(), rev=0):
-    return df_query(_conn, q, params)
+def df_query_cached(_conn, q, params=(), rev=(0, True)):
+    return df_from_cursor(_conn.read(q, params))
+
+
+RESERVATION_COLUMNS = (
+    "id, d, start_time, end_time, customer_name, phone, people_count, table_no, status, note, created_by, version, "
+    "customer_id"
+)
+
+
+def fetch_reservation(conn: DBConn, branch_id: int, rid: int) -> dict | None:
+    cur = conn.execute(
+        f"SELECT {RESERVATION_COLUMNS} FROM reservation WHERE id=? AND branch_id=?",
+        (int(rid), int(branch_id)),
+    )
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return dict(zip([c[0] for c in cur.description], row))
 
 
-def col_name(df: pd.DataFrame, preferred: str) -> str | None:
+def reservation_pc_ids(conn: DBConn, rid: int) -> list[int]:
+    rows = conn.execute("SELECT pc_id FROM reservation_pc WHERE reservation_id=?", (int(rid),)).fetchall()
+    return [int(r[0]) for r in rows]
+
+
+def set_reservation_pcs(conn: DBConn, branch_id: int, rid: int, pc_ids: list[int]):
+    conn.execute("DELETE FROM reservation_pc WHERE reservation_id=?", (int(rid),))
+    for pc_id in pc_ids:
+        conn.execute(
+            "INSERT INTO reservation_pc(reservation_id, pc_id, branch_id) VALUES(?,?,?)",
+            (int(rid), int(pc_id), int(branch_id)),
+        )
+
+
+def update_reservation(
+    conn: DBConn, branch_id: int, rid: int, version: int, values: dict, pc_ids: list[int] | None = None
+) -> tuple[bool, dict | None]:
+    # Compare-and-swap on version: a stale edit never overwrites; the current row is returned instead.
+    assignments = ", ".join(f"{k}=?" for k in values)
+    cur = conn.execute(
+        f"UPDATE reservation SET {assignments}, version=version+1 WHERE id=? AND branch_id=? AND version=?",
+        (*values.values(), int(rid), int(branch_id), int(version)),
+    )
+    if cur.rowcount == 1:
+        if pc_ids is not None:
+            set_reservation_pcs(conn, branch_id, rid, pc_ids)
+        conn.commit()
+        return True, None
+    # Nothing from a losing edit is kept, including a customer row created for it.
+    conn.rollback()
+    # The stale copy came from the cache/replica; reload this session's data from the primary.
+    conn.stick_to_primary()
+    return False, fetch_reservation(conn, branch_id, rid)
+
+
+def delete_reservation(conn: DBConn, branch_id: int, rid: int, version: int) -> tuple[bool, dict | None]:
+    cur = conn.execute(
+        "DELETE FROM reservation WHERE id=? AND branch_id=? AND version=?",
+        (int(rid), int(branch_id), int(version)),
+    )
+    if cur.rowcount == 1:
+        conn.commit()
+        return True, None
+    conn.rollback()
+    conn.stick_to_primary()
+    return False, fetch_reservation(conn, branch_id, rid)
+
+
+def render_reservation_conflict():
+    conflict = st.session_state.pop("reservation_conflict", None)
+    if conflict is None:
+        return
+    fresh = conflict.get("row")
+    if fresh is None:
+        st.error("Bu rezervasyon siz islem yaparken baska biri tarafindan silindi. Degisiklikleriniz kaydedilmedi.")
+        return
+    st.error(
+        "Bu rezervasyon siz islem yaparken baska biri tarafindan degistirildi. "
+        "Degisiklikleriniz kaydedilmedi; guncel kayit asagida, lutfen tekrar deneyin."
+    )
+    st.dataframe([fresh], use_container_width=True, hide_index=True)
+
+
+@st.cache_data(show_spinner=False, ttl=60)
+def search_customers(_conn, branch_id: int, text: str, rev=(0, True), limit: int = 10) -> list[tuple[int, str, str]]:
+    phone_prefix = normalize_phone(text)
+    name_prefix = normalize_name(text)
+    if phone_prefix and not any(ch.isalpha() for ch in text):
+        column, prefix = "phone_norm", phone_prefix
+    elif name_prefix:
+        column, prefix = "name_norm", name_prefix
+    else:
+        return []
+    low, high = prefix_range(prefix)
+    rows = _conn.read(
+        f"""
+        SELECT id, name, COALESCE(phone, '')
+        FROM customer
+        WHERE branch_id = ?
+          AND {column} >= ?
+          AND {column} < ?
+        ORDER BY {column}
+        LIMIT ?
+        """,
+        (int(branch_id), low, high, int(limit)),
+    ).fetchall()
+    return [(int(r[0]), str(r[1]), str(r[2])) for r in rows]
+
+
+@st.cache_data(show_spinner=False, ttl=300)
+def load_branches(_conn, rev=(0, True)) -> list[tuple[int, str, str]]:
+    rows = _conn.read("SELECT id, code, name FROM branch ORDER BY id").fetchall()
+    return [(int(r[0]), str(r[1]), str(r[2])) for r in rows]
+
+
+def layout_pc_labels(layout: list[tuple[int, str, str, list[tuple[int, str]]]]) -> dict[int, str]:
+    return {pc_id: label for _, _, _, pcs in layout for pc_id, label in pcs}
+
+
+@st.cache_data(show_spinner=False, ttl=300)
+def load_layout_index(_conn, branch_id: int, rev=(0, True)) -> list[tuple[int, str, str, list[tuple[int, str]]]]:
+    # One query per branch; result is [(area_id, area_name, area_code, [(pc_id, label), ...]), ...]
+    rows = _conn.read(
+        """
+        SELECT a.id, a.name, a.code, p.id, p.label
+        FROM area a
+        LEFT JOIN pc p ON p.area_id = a.id
+        WHERE a.branch_id = ?
+        ORDER BY a.sort_order, a.id, p.sort_order, p.id
+        """,
+        (int(branch_id),),
+    ).fetchall()
+    areas: list[tuple[int, str, str, list[tuple[int, str]]]] = []
+    for area_id, area_name, area_code, pc_id, label in rows:
+        if not areas or areas[-1][0] != int(area_id):
+            areas.append((int(area_id), str(area_name), str(area_code), []))
+        if pc_id is not None:
+            areas[-1][3].append((int(pc_id), str(label)))
+    return areas
+
+
+def col_name(df: "pd.DataFrame", preferred: str) -> str | None:
     if preferred in df.columns:
         return preferred
     low = preferred.lower()
@@ -246,6 +902,12 @@ def col_name(df: pd.DataFrame, preferred: str) -> str | None:
     return None
 
 
+def cell_text(v) -> str:
+    import pandas as pd
+
+    return "" if pd.isna(v) else str(v)
+
+
 def status_badge(s: str) -> str:
     s = str(s).lower()
     if s == "onayli":
@@ -257,6 +919,12 @@ def status_badge(s: str) -> str:
     return s
 
 
+def logout_session():
+    for k in ("authenticated", "username", "role", "token_epoch", "token_id", "token_exp"):
+        st.session_state.pop(k, None)
+    st.query_params.pop(SESSION_QUERY_PARAM, None)
+
+
 def check_login(conn: DBConn) -> bool:
     if "authenticated" not in st.session_state:
         st.session_state.authenticated = False
@@ -264,9 +932,32 @@ def check_login(conn: DBConn) -> bool:
     if st.session_state.authenticated:
         if "username" not in st.session_state:
             st.session_state.username = APP_USER
-        if "role" not in st.session_state:
-            st.session_state.role = "admin"
-        return True
+        # Revocations and role changes reach open sessions too; checked in memory, without a DB query.
+        state = user_token_state(conn, st.session_state.username)
+        if (
+            state is not None
+            and state[0] == st.session_state.get("token_epoch")
+            and not token_revoked(conn, st.session_state.get("token_id"))
+        ):
+            st.session_state.role = state[1]
+            return True
+        logout_session()
+
+    # New tab or reconnect after a restart: a valid signed token logs in without touching the database.
+    secret = load_session_secret(conn)
+    token = st.query_params.get(SESSION_QUERY_PARAM)
+    if token:
+        claims = verify_session_token(secret, token)
+        state = user_token_state(conn, str(claims["u"])) if claims else None
+        if state is not None and state[0] == claims.get("e") and not token_revoked(conn, claims["j"]):
+            st.session_state.authenticated = True
+            st.session_state.username = str(claims["u"])
+            st.session_state.role = state[1]
+            st.session_state.token_epoch = state[0]
+            st.session_state.token_id = claims["j"]
+            st.session_state.token_exp = int(claims["exp"])
+            return True
+        del st.query_params[SESSION_QUERY_PARAM]
 
     st.title("Old School Rezervasyon Yonetimi")
     st.subheader("Giris Yap")
@@ -278,16 +969,40 @@ def check_login(conn: DBConn) -> bool:
     st.caption("Varsayilan kullanici: admin | Varsayilan parola: 123456")
 
     if submitted:
+        username = username.strip()
+        wait = login_blocked_seconds(username)
+        if wait:
+            st.error(f"Cok fazla hatali deneme. {wait} saniye sonra tekrar deneyin.")
+            return False
         row = conn.execute(
-            "SELECT username, password_hash, role FROM app_user WHERE username=?",
-            (username.strip(),),
+            "SELECT username, password_hash, role, token_epoch FROM app_user WHERE username=?",
+            (username,),
         ).fetchone()
-        if row and hash_password(password) == str(row[1]):
+        stored_hash = str(row[1]) if row else dummy_password_hash()
+        password_ok = login_pool().submit(verify_password, password, stored_hash).result()
+        if row and password_ok:
+            if password_needs_rehash(str(row[1])):
+                new_hash = login_pool().submit(hash_password, password).result()
+                conn.execute("UPDATE app_user SET password_hash=? WHERE username=?", (new_hash, str(row[0])))
+                conn.commit()
+            clear_login_failures(username)
+            set_user_token_state(conn, str(row[0]), int(row[3]), str(row[2]))
             st.session_state.authenticated = True
             st.session_state.username = str(row[0])
             st.session_state.role = str(row[2]).lower()
+            st.session_state.token_epoch = int(row[3])
+            st.session_state.token_id = secrets.token_hex(16)
+            st.session_state.token_exp = int(time.time()) + SESSION_TTL_SECONDS
+            st.query_params[SESSION_QUERY_PARAM] = issue_session_token(
+                secret,
+                str(row[0]),
+                int(row[3]),
+                st.session_state.token_id,
+                st.session_state.token_exp,
+            )
             st.rerun()
         else:
+            record_login_failure(username)
             st.error("Hatali kullanici adi veya sifre")
     return False
 
@@ -340,21 +1055,27 @@ def overlaps(a_start: datetime, a_end: datetime, b_start: datetime, b_end: datet
 
 
 @st.cache_data(show_spinner=False, ttl=60)
-def reservation_rows_for_window(_conn, d_prev: str, d_str: str, d_next: str, exclude_id: int | None, rev: int):
+def reservation_rows_for_window(
+    _conn, branch_id: int, d_prev: str, d_str: str, d_next: str, exclude_id: int | None, rev
+):
     q = """
-        SELECT id, d, start_time, end_time, table_no
-        FROM reservation
-        WHERE d IN (?, ?, ?)
-          AND status != 'iptal'
+        SELECT r.d, r.start_time, r.end_time, rp.pc_id
+        FROM reservation r
+        JOIN reservation_pc rp ON rp.reservation_id = r.id
+        WHERE r.branch_id = ?
+          AND r.d IN (?, ?, ?)
+          AND r.status != 'iptal'
     """
-    params: list[object] = [d_prev, d_str, d_next]
+    params: list[object] = [int(branch_id), d_prev, d_str, d_next]
     if exclude_id is not None:
-        q += " AND id != ?"
+        q += " AND r.id != ?"
         params.append(int(exclude_id))
     return _conn.execute(q, tuple(params)).fetchall()
 
 
-def collect_occupied_pcs(conn: DBConn, d_str: str, start_time: str, end_time: str, exclude_id: int | None = None) -> set[str]:
+def collect_occupied_pcs(
+    conn: DBConn, branch_id: int, d_str: str, start_time: str, end_time: str, exclude_id: int | None = None
+) -> set[int]:
     cand = reservation_bounds(d_str, start_time, end_time)
     if cand is None:
         return set()
@@ -363,30 +1084,37 @@ def collect_occupied_pcs(conn: DBConn, d_str: str, start_time: str, end_time: st
     d_prev = (d0 - timedelta(days=1)).isoformat()
     d_next = (d0 + timedelta(days=1)).isoformat()
 
-    rev = int(st.session_state.get("db_rev", 0))
-    rows = reservation_rows_for_window(conn, d_prev, d_str, d_next, exclude_id, rev)
-    occ: set[str] = set()
-    for _, rd, rst, ret, pcs in rows:
+    rev = data_rev(conn)
+    rows = reservation_rows_for_window(conn, branch_id, d_prev, d_str, d_next, exclude_id, rev)
+    occ: set[int] = set()
+    for rd, rst, ret, pc_id in rows:
         rb = reservation_bounds(str(rd), str(rst), str(ret))
         if rb is None:
             continue
         r_start, r_end = rb
         if overlaps(cand_start, cand_end, r_start, r_end):
-            for p in normalize_pc_list(pcs):
-                occ.add(p)
+            occ.add(int(pc_id))
     return occ
 
 
-def render_pc_picker(key_prefix: str, occupied: set[str], preselected: list[str] | None = None) -> list[str]:
+def render_pc_picker(
+    key_prefix: str,
+    layout: list[tuple[int, str, str, list[tuple[int, str]]]],
+    occupied: set[int],
+    preselected: list[int] | None = None,
+) -> list[int]:
     preselected = preselected or []
-    selected: list[str] = []
+    selected: list[int] = []
     st.markdown("#### Bilgisayar Secimi")
     st.markdown("🟩 Bos   |   🟥 Dolu (kilitli)   |   🟦 Secili")
     st.caption("Rezervasyon icin en az 1 bilgisayar sec.")
+    if not layout:
+        st.info("Bu subede tanimli alan/bilgisayar yok.")
+        return selected
 
-    for area_name, area_code, count in AREA_LAYOUT:
-        area_pc_ids = [f"{area_code}-{i:02d}" for i in range(1, count + 1)]
-        area_occ = sum(1 for pc in area_pc_ids if pc in occupied and pc not in preselected)
+    for _, area_name, _, pcs in layout:
+        count = len(pcs)
+        area_occ = sum(1 for pc_id, _ in pcs if pc_id in occupied and pc_id not in preselected)
 
         with st.container(border=True):
             st.markdown(f"<div class='pc-area-title'>{area_name}</div>", unsafe_allow_html=True)
@@ -395,20 +1123,19 @@ def render_pc_picker(key_prefix: str, occupied: set[str], preselected: list[str]
                 unsafe_allow_html=True,
             )
             cols = st.columns(6)
-            for i in range(1, count + 1):
-                pc_id = f"{area_code}-{i:02d}"
+            for i, (pc_id, label) in enumerate(pcs):
                 default_val = pc_id in preselected
                 disabled = (pc_id in occupied) and (pc_id not in preselected)
                 if disabled:
-                    label = f"🟥 {pc_id}"
+                    shown = f"🟥 {label}"
                 elif default_val:
-                    label = f"🟦 {pc_id}"
+                    shown = f"🟦 {label}"
                 else:
-                    label = f"🟩 {pc_id}"
-                col = cols[(i - 1) % 6]
+                    shown = f"🟩 {label}"
+                col = cols[i % 6]
                 with col:
                     val = st.checkbox(
-                        label,
+                        shown,
                         value=default_val,
                         key=f"{key_prefix}_{pc_id}",
                         disabled=disabled,
@@ -416,25 +1143,39 @@ def render_pc_picker(key_prefix: str, occupied: set[str], preselected: list[str]
                 if val:
                     selected.append(pc_id)
         st.write("")
-    return sorted(selected)
+    return selected
+
 
+@st.cache_resource(show_spinner=False)
+def ensure_schema(database_url: str) -> bool:
+    # Schema/seed checks run once per process instead of once per browser session.
+    setup_conn = get_conn(read=False)
+    try:
+        init_db(setup_conn)
+    finally:
+        setup_conn.close()
+    return True
 
-conn = get_conn()
-if "db_initialized" not in st.session_state:
-    init_db(conn)
-    st.session_state.db_initialized = True
-if "db_rev" not in st.session_state:
-    st.session_state.db_rev = 0
+
+ensure_schema(DATABASE_URL)
+# One connection per browser session, reused across reruns.
+if "db_conn" not in st.session_state or st.session_state.db_conn.closed:
+    st.session_state.db_conn = get_conn(st.session_state)
+conn = st.session_state.db_conn
 
 if not check_login(conn):
     st.stop()
 
+if conn.read_error:
+    st.sidebar.warning(f"Okuma replikasi kullanilamiyor, tum sorgular birincil veritabanina gidiyor: {conn.read_error}")
+
 st.title("Old School Rezervasyon Yonetimi")
 
 today = date.today()
-MENU_OPTIONS = ["Dashboard", "Yeni Rezervasyon", "Rezervasyon Listesi"]
+MENU_OPTIONS = ["Dashboard", "Yeni Rezervasyon", "Rezervasyon Listesi", "Musteri Gecmisi"]
 if str(st.session_state.get("role", "")).lower() == "admin":
     MENU_OPTIONS.append("Kullanici Yonetimi")
+    MENU_OPTIONS.append("Sube Yonetimi")
 
 if "page_ui" not in st.session_state:
     st.session_state.page_ui = "Dashboard"
@@ -450,13 +1191,37 @@ with st.sidebar:
     )
     if page_pick != current_page:
         st.session_state.page_ui = page_pick
+    branches = load_branches(conn, data_rev(conn, "layout"))
+    branch_ids = [b[0] for b in branches]
+    if st.session_state.get("branch_id") not in branch_ids:
+        st.session_state.branch_id = branch_ids[0]
+    branch_pick = st.selectbox(
+        "Sube",
+        branch_ids,
+        index=branch_ids.index(st.session_state.branch_id),
+        format_func=lambda bid: next(b[2] for b in branches if b[0] == bid),
+    )
+    if branch_pick != st.session_state.branch_id:
+        st.session_state.branch_id = branch_pick
     selected_day = st.date_input("Tarih", value=today)
+    st.caption(f"Kullanici: {st.session_state.get('username', '-')}")
+    if st.button("Cikis Yap", use_container_width=True):
+        revoke_session_token(conn, st.session_state.get("token_id"), st.session_state.get("token_exp"))
+        logout_session()
+        st.rerun()
+    if st.button("Tum Cihazlardan Cikis", use_container_width=True):
+        revoke_user_tokens(conn, str(st.session_state.get("username", "")))
+        logout_session()
+        st.rerun()
 
 page = st.session_state.get("page_ui", "Dashboard")
+branch_id = int(st.session_state.branch_id)
+layout = load_layout_index(conn, branch_id, data_rev(conn, "layout"))
 
 
 if page == "Dashboard":
     st.subheader(f"{selected_day.isoformat()} Ozeti")
+    render_reservation_conflict()
     if st.button("Rezervasyon Ekle", type="primary"):
         st.session_state.page_ui = "Yeni Rezervasyon"
         st.rerun()
@@ -466,11 +1231,12 @@ if page == "Dashboard":
         """
         SELECT status, COUNT(*) AS adet
         FROM reservation
-        WHERE d = ?
+        WHERE branch_id = ?
+          AND d = ?
         GROUP BY status
         """,
-        (selected_day.isoformat(),),
-        int(st.session_state.get("db_rev", 0)),
+        (branch_id, selected_day.isoformat()),
+        data_rev(conn),
     )
     total = int(rows["adet"].sum()) if len(rows) else 0
     c1, c2, c3, c4 = st.columns(4)
@@ -487,11 +1253,12 @@ if page == "Dashboard":
                table_no AS "Bilgisayarlar", status AS "Durum", note AS "Notlar",
                COALESCE(created_by, '-') AS "Olusturan"
         FROM reservation
-        WHERE d = ?
+        WHERE branch_id = ?
+          AND d = ?
         ORDER BY start_time
         """,
-        (selected_day.isoformat(),),
-        int(st.session_state.get("db_rev", 0)),
+        (branch_id, selected_day.isoformat()),
+        data_rev(conn),
     )
     if len(day_list):
         durum_col = col_name(day_list, "Durum")
@@ -532,18 +1299,31 @@ if page == "Dashboard":
                             st.rerun()
                     with del_col:
                         if st.button("Sil", key=f"dash_delete_{rid}", use_container_width=True, type="secondary"):
-                            st.session_state[f"confirm_delete_{rid}"] = True
-
-                if st.session_state.get(f"confirm_delete_{rid}", False):
-                    st.warning("Bu rezervasyon silinsin mi?")
+                            # Confirm against the current primary row, not the cached list entry.
+                            fresh = fetch_reservation(conn, branch_id, rid)
+                            if fresh is None:
+                                st.session_state.reservation_conflict = {"id": rid, "row": None}
+                                bump_data_rev()
+                                conn.stick_to_primary()
+                                st.rerun()
+                            st.session_state[f"confirm_delete_{rid}"] = fresh
+
+                confirm_row = st.session_state.get(f"confirm_delete_{rid}")
+                if confirm_row:
+                    st.warning(
+                        f"Bu rezervasyon silinsin mi? {confirm_row['customer_name']}, "
+                        f"{confirm_row['start_time']} - {confirm_row['end_time']}, PC: {confirm_row['table_no'] or '-'}"
+                    )
                     c_yes, c_no = st.columns(2)
                     with c_yes:
                         if st.button("Evet, Sil", key=f"dash_delete_yes_{rid}", use_container_width=True, type="primary"):
-                            conn.execute("DELETE FROM reservation WHERE id=?", (rid,))
-                            conn.commit()
-                            st.session_state.db_rev = int(st.session_state.get("db_rev", 0)) + 1
+                            ok, fresh = delete_reservation(conn, branch_id, rid, int(confirm_row["version"]))
+                            bump_data_rev()
                             st.session_state.pop(f"confirm_delete_{rid}", None)
-                            st.success("Rezervasyon silindi.")
+                            if ok:
+                                st.success("Rezervasyon silindi.")
+                            else:
+                                st.session_state.reservation_conflict = {"id": rid, "row": fresh}
                             st.rerun()
                     with c_no:
                         if st.button("Vazgeç", key=f"dash_delete_no_{rid}", use_container_width=True):
@@ -555,6 +1335,20 @@ if page == "Dashboard":
 elif page == "Yeni Rezervasyon":
     st.subheader("Yeni Rezervasyon")
     st.caption("Sabahlama icin varsayilan saatler: 22:00 - 07:00 (ertesi gun).")
+    rev = data_rev(conn)
+    customer_q = st.text_input("Kayitli musteri ara (telefon veya ad)", key="new_customer_q")
+    picked_customer = None
+    if customer_q.strip():
+        matches = {m[0]: m for m in search_customers(conn, branch_id, customer_q, rev)}
+        if matches:
+            picked_customer_id = st.selectbox(
+                "Musteri",
+                [None] + list(matches),
+                format_func=lambda cid: "Yeni musteri" if cid is None else f"{matches[cid][1]} ({matches[cid][2] or '-'})",
+            )
+            picked_customer = matches.get(picked_customer_id)
+        else:
+            st.caption("Eslesen musteri yok.")
     with st.form("create_reservation"):
         d = st.date_input("Tarih", value=selected_day)
         c1, c2 = st.columns(2)
@@ -562,14 +1356,14 @@ elif page == "Yeni Rezervasyon":
         end_unknown = c2.checkbox("Bitis belirsiz", value=False)
         end_time = c2.text_input("Bitis (HH:MM)", value="07:00", disabled=end_unknown)
         final_end_time = UNKNOWN_END_LABEL if end_unknown else end_time.strip()
-        customer_name = st.text_input("Musteri Adi", value="")
-        phone = st.text_input("Telefon", value="")
+        customer_name = st.text_input("Musteri Adi", value=picked_customer[1] if picked_customer else "")
+        phone = st.text_input("Telefon", value=picked_customer[2] if picked_customer else "")
         c3, c4 = st.columns(2)
         status = c3.selectbox("Durum", ["onayli", "beklemede", "iptal"], index=0)
         note = c4.text_input("Not", value="")
 
-        occupied = collect_occupied_pcs(conn, d.isoformat(), start_time.strip(), final_end_time)
-        selected_pcs = render_pc_picker("new_pc", occupied, preselected=[])
+        occupied = collect_occupied_pcs(conn, branch_id, d.isoformat(), start_time.strip(), final_end_time)
+        selected_pcs = render_pc_picker("new_pc", layout, occupied, preselected=[])
         st.caption(f"Secilen bilgisayar sayisi: {len(selected_pcs)}")
         submitted = st.form_submit_button("Rezervasyon Ekle", type="primary")
 
@@ -581,45 +1375,60 @@ elif page == "Yeni Rezervasyon":
         elif reservation_bounds(d.isoformat(), start_time.strip(), final_end_time) is None:
             st.warning("Saat formati hatali. HH:MM (ornek 22:00) gir ya da bitisi belirsiz sec.")
         else:
-            conn.execute(
+            pc_labels = layout_pc_labels(layout)
+            if (
+                picked_customer
+                and customer_name.strip() == picked_customer[1]
+                and phone.strip() == picked_customer[2]
+            ):
+                customer_id = picked_customer[0]
+            else:
+                customer_id = find_or_create_customer(conn, branch_id, customer_name, phone)
+            new_id = conn.insert(
                 """
                 INSERT INTO reservation(
-                    d, start_time, end_time, customer_name, phone, people_count, table_no, status, note, created_at, created_by
-                ) VALUES(?,?,?,?,?,?,?,?,?,?,?)
+                    branch_id, customer_id, d, start_time, end_time, customer_name, phone, people_count, table_no,
+                    status, note, created_at, created_by
+                ) VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?)
                 """,
                 (
+                    branch_id,
+                    customer_id,
                     d.isoformat(),
                     start_time.strip(),
                     final_end_time,
                     customer_name.strip(),
                     phone.strip() or None,
                     int(len(selected_pcs)),
-                    ", ".join(selected_pcs),
+                    ", ".join(sorted(pc_labels[p] for p in selected_pcs)),
                     status,
                     note.strip() or None,
                     datetime.now().isoformat(timespec="seconds"),
                     str(st.session_state.get("username", "")).strip() or None,
                 ),
             )
+            set_reservation_pcs(conn, branch_id, new_id, selected_pcs)
             conn.commit()
-            st.session_state.db_rev = int(st.session_state.get("db_rev", 0)) + 1
+            bump_data_rev()
             st.success("Rezervasyon eklendi.")
             st.rerun()
 
 elif page == "Rezervasyon Listesi":
     st.subheader("Rezervasyon Listesi")
+    render_reservation_conflict()
     q = st.text_input("Ara (musteri/telefon/masa/not)")
     status_filter = st.multiselect("Durum", ["onayli", "beklemede", "iptal"], default=["onayli", "beklemede", "iptal"])
 
     rows = df_query_cached(
         conn,
-        """
-        SELECT id, d, start_time, end_time, customer_name, phone, people_count, table_no, status, note, created_by
+        f"""
+        SELECT {RESERVATION_COLUMNS}
         FROM reservation
+        WHERE branch_id = ?
         ORDER BY d DESC, start_time DESC
         """,
-        (),
-        int(st.session_state.get("db_rev", 0)),
+        (branch_id,),
+        data_rev(conn),
     )
     if len(rows):
         filtered = rows.copy()
@@ -629,7 +1438,7 @@ elif page == "Rezervasyon Listesi":
             text = filtered.fillna("").astype(str).agg(" | ".join, axis=1).str.lower()
             filtered = filtered[text.str.contains(q.strip().lower(), regex=False)]
 
-        show = filtered.rename(
+        show = filtered.drop(columns=["version", "customer_id"]).rename(
             columns={
                 "d": "Tarih",
                 "start_time": "Baslangic",
@@ -653,12 +1462,22 @@ elif page == "Rezervasyon Listesi":
         desired = st.session_state.pop("edit_reservation_id", None)
         idx = opts.index(desired) if desired in opts else 0
         picked_id = st.selectbox("Rezervasyon Sec", opts, index=idx)
-        row = filtered.loc[filtered["id"] == picked_id].iloc[0]
+        # The list may come from the shared cache or the replica; the form and its CAS version come from the primary.
+        row = fetch_reservation(conn, branch_id, int(picked_id))
+        if row is None:
+            st.session_state.reservation_conflict = {"id": int(picked_id), "row": None}
+            bump_data_rev()
+            conn.stick_to_primary()
+            st.rerun()
+        # The submit rerun reloads the row, so the version checked is the one shown on the previous run.
+        seen = st.session_state.get("edit_seen_version")
+        seen_version = seen[1] if seen and seen[0] == int(picked_id) else int(row["version"])
+        st.session_state.edit_seen_version = (int(picked_id), int(row["version"]))
         with st.form("edit_reservation"):
             ed = st.date_input("Tarih", value=date.fromisoformat(str(row["d"])))
             c1, c2 = st.columns(2)
             est = c1.text_input("Baslangic (HH:MM)", value=str(row["start_time"]))
-            row_end_time = "" if pd.isna(row["end_time"]) else str(row["end_time"])
+            row_end_time = cell_text(row["end_time"])
             end_unknown_edit = c2.checkbox(
                 "Bitis belirsiz",
                 value=row_end_time.strip().lower() == UNKNOWN_END_LABEL,
@@ -670,15 +1489,15 @@ elif page == "Rezervasyon Listesi":
             )
             final_edit_end = UNKNOWN_END_LABEL if end_unknown_edit else eet.strip()
             ename = st.text_input("Musteri Adi", value=str(row["customer_name"]))
-            ephone = st.text_input("Telefon", value="" if pd.isna(row["phone"]) else str(row["phone"]))
+            ephone = st.text_input("Telefon", value=cell_text(row["phone"]))
             estatus = st.selectbox("Durum", ["onayli", "beklemede", "iptal"], index=["onayli", "beklemede", "iptal"].index(str(row["status"])))
-            enote = st.text_input("Not", value="" if pd.isna(row["note"]) else str(row["note"]))
+            enote = st.text_input("Not", value=cell_text(row["note"]))
 
             occupied_edit = collect_occupied_pcs(
-                conn, ed.isoformat(), est.strip(), final_edit_end, exclude_id=int(picked_id)
+                conn, branch_id, ed.isoformat(), est.strip(), final_edit_end, exclude_id=int(picked_id)
             )
-            preselected = normalize_pc_list(None if pd.isna(row["table_no"]) else str(row["table_no"]))
-            eselected_pcs = render_pc_picker(f"edit_{picked_id}", occupied_edit, preselected=preselected)
+            preselected = reservation_pc_ids(conn, int(picked_id))
+            eselected_pcs = render_pc_picker(f"edit_{picked_id}", layout, occupied_edit, preselected=preselected)
             st.caption(f"Secilen bilgisayar sayisi: {len(eselected_pcs)}")
             b1, b2 = st.columns(2)
             save = b1.form_submit_button("Guncelle", type="primary")
@@ -692,39 +1511,85 @@ elif page == "Rezervasyon Listesi":
             elif reservation_bounds(ed.isoformat(), est.strip(), final_edit_end) is None:
                 st.warning("Saat formati hatali. HH:MM (ornek 22:00) gir ya da bitisi belirsiz sec.")
             else:
-                conn.execute(
-                    """
-                    UPDATE reservation
-                    SET d=?, start_time=?, end_time=?, customer_name=?, phone=?, people_count=?, table_no=?, status=?, note=?
-                    WHERE id=?
-                    """,
-                    (
-                        ed.isoformat(),
-                        est.strip(),
-                        final_edit_end,
-                        ename.strip(),
-                        ephone.strip() or None,
-                        int(len(eselected_pcs)),
-                        ", ".join(eselected_pcs),
-                        estatus,
-                        enote.strip() or None,
-                        int(picked_id),
-                    ),
+                if (
+                    row["customer_id"] is not None
+                    and ename.strip() == str(row["customer_name"])
+                    and ephone.strip() == cell_text(row["phone"])
+                ):
+                    customer_id = int(row["customer_id"])
+                else:
+                    customer_id = find_or_create_customer(conn, branch_id, ename, ephone)
+                ok, fresh = update_reservation(
+                    conn,
+                    branch_id,
+                    int(picked_id),
+                    seen_version,
+                    {
+                        "d": ed.isoformat(),
+                        "start_time": est.strip(),
+                        "end_time": final_edit_end,
+                        "customer_name": ename.strip(),
+                        "phone": ephone.strip() or None,
+                        "customer_id": customer_id,
+                        "people_count": int(len(eselected_pcs)),
+                        "table_no": ", ".join(sorted(layout_pc_labels(layout)[p] for p in eselected_pcs)),
+                        "status": estatus,
+                        "note": enote.strip() or None,
+                    },
+                    pc_ids=eselected_pcs,
                 )
-                conn.commit()
-                st.session_state.db_rev = int(st.session_state.get("db_rev", 0)) + 1
-                st.success("Rezervasyon guncellendi.")
+                bump_data_rev()
+                if ok:
+                    st.success("Rezervasyon guncellendi.")
+                else:
+                    st.session_state.reservation_conflict = {"id": int(picked_id), "row": fresh}
+                    st.session_state.edit_reservation_id = int(picked_id)
                 st.rerun()
 
         if cancel:
-            conn.execute("UPDATE reservation SET status='iptal' WHERE id=?", (int(picked_id),))
-            conn.commit()
-            st.session_state.db_rev = int(st.session_state.get("db_rev", 0)) + 1
-            st.success("Rezervasyon iptal olarak isaretlendi.")
+            ok, fresh = update_reservation(conn, branch_id, int(picked_id), seen_version, {"status": "iptal"})
+            bump_data_rev()
+            if ok:
+                st.success("Rezervasyon iptal olarak isaretlendi.")
+            else:
+                st.session_state.reservation_conflict = {"id": int(picked_id), "row": fresh}
+                st.session_state.edit_reservation_id = int(picked_id)
             st.rerun()
     else:
         st.info("Henuz rezervasyon kaydi yok.")
 
+elif page == "Musteri Gecmisi":
+    st.subheader("Musteri Gecmisi")
+    rev = data_rev(conn)
+    history_q = st.text_input("Musteri ara (telefon veya ad)")
+    matches = {m[0]: m for m in search_customers(conn, branch_id, history_q, rev)} if history_q.strip() else {}
+    if not history_q.strip():
+        st.info("Telefon numarasi veya ismin basini yazin.")
+    elif not matches:
+        st.info("Eslesen musteri yok.")
+    else:
+        picked_id = st.selectbox("Musteri", list(matches), format_func=lambda cid: f"{matches[cid][1]} ({matches[cid][2] or '-'})")
+        history = df_query_cached(
+            conn,
+            """
+            SELECT d AS "Tarih", start_time AS "Baslangic", end_time AS "Bitis",
+                   table_no AS "Bilgisayarlar", status AS "Durum", note AS "Notlar",
+                   COALESCE(created_by, '-') AS "Olusturan"
+            FROM reservation
+            WHERE branch_id = ?
+              AND customer_id = ?
+            ORDER BY d DESC, start_time DESC
+            """,
+            (branch_id, int(picked_id)),
+            rev,
+        )
+        c1, c2 = st.columns(2)
+        c1.metric("Toplam Rezervasyon", len(history))
+        c2.metric("Son Ziyaret", str(history["Tarih"].iloc[0]) if len(history) else "-")
+        if len(history):
+            history["Durum"] = history["Durum"].apply(status_badge)
+            st.dataframe(history, use_container_width=True, hide_index=True)
+
 elif page == "Kullanici Yonetimi":
     if str(st.session_state.get("role", "")).lower() != "admin":
         st.error("Bu sayfaya sadece admin erisebilir.")
@@ -738,7 +1603,7 @@ elif page == "Kullanici Yonetimi":
             ORDER BY username
             """,
             (),
-            int(st.session_state.get("db_rev", 0)),
+            data_rev(conn),
         )
         st.dataframe(users, use_container_width=True, hide_index=True)
 
@@ -765,12 +1630,77 @@ elif page == "Kullanici Yonetimi":
                         "INSERT INTO app_user(username, password_hash, role, created_at) VALUES(?,?,?,?)",
                         (
                             u,
-                            hash_password(p),
+                            login_pool().submit(hash_password, p).result(),
                             new_role,
                             datetime.now().isoformat(timespec="seconds"),
                         ),
                     )
                     conn.commit()
-                    st.session_state.db_rev = int(st.session_state.get("db_rev", 0)) + 1
+                    set_user_token_state(conn, u, 0, new_role)
+                    bump_data_rev()
                     st.success(f"Kullanici olusturuldu: {u}")
                     st.rerun()
+
+elif page == "Sube Yonetimi":
+    if str(st.session_state.get("role", "")).lower() != "admin":
+        st.error("Bu sayfaya sadece admin erisebilir.")
+    else:
+        st.subheader("Sube Yonetimi")
+        for b_id, b_code, b_name in branches:
+            b_layout = load_layout_index(conn, b_id, data_rev(conn, "layout"))
+            with st.container(border=True):
+                st.markdown(f"**{b_name}** ({b_code})")
+                if b_layout:
+                    st.caption(" | ".join(f"{a_name} ({a_code}): {len(pcs)} PC" for _, a_name, a_code, pcs in b_layout))
+                else:
+                    st.caption("Henuz alan tanimli degil.")
+
+        st.markdown("### Yeni Sube")
+        with st.form("create_branch_form"):
+            new_branch_code = st.text_input("Sube Kodu")
+            new_branch_name = st.text_input("Sube Adi")
+            create_branch = st.form_submit_button("Sube Olustur", type="primary")
+
+        if create_branch:
+            bc = new_branch_code.strip().upper()
+            bn = new_branch_name.strip()
+            if not bc or not bn:
+                st.warning("Sube kodu ve adi zorunlu.")
+            elif conn.execute("SELECT id FROM branch WHERE code=?", (bc,)).fetchone():
+                st.warning("Bu sube kodu zaten var.")
+            else:
+                conn.execute(
+                    "INSERT INTO branch(code, name, created_at) VALUES(?,?,?)",
+                    (bc, bn, datetime.now().isoformat(timespec="seconds")),
+                )
+                conn.commit()
+                bump_data_rev("layout")
+                st.success(f"Sube olusturuldu: {bn}")
+                st.rerun()
+
+        st.markdown("### Subeye Alan Ekle")
+        with st.form("create_area_form"):
+            area_branch = st.selectbox(
+                "Sube",
+                [b[0] for b in branches],
+                format_func=lambda bid: next(b[2] for b in branches if b[0] == bid),
+            )
+            new_area_name = st.text_input("Alan Adi")
+            new_area_code = st.text_input("Alan Kodu (PC on eki, ornek Y)")
+            new_area_count = st.number_input("Bilgisayar Sayisi", min_value=1, max_value=200, value=10, step=1)
+            create_area_btn = st.form_submit_button("Alan Ekle", type="primary")
+
+        if create_area_btn:
+            ac = new_area_code.strip().upper()
+            an = new_area_name.strip()
+            if not ac or not an:
+                st.warning("Alan adi ve kodu zorunlu.")
+            elif conn.execute("SELECT id FROM area WHERE branch_id=? AND code=?", (int(area_branch), ac)).fetchone():
+                st.warning("Bu subede ayni alan kodu zaten var.")
+            else:
+                next_order = len(load_layout_index(conn, int(area_branch), data_rev(conn, "layout")))
+                create_area(conn, int(area_branch), an, ac, int(new_area_count), next_order)
+                conn.commit()
+                bump_data_rev("layout")
+                st.success(f"Alan eklendi: {an}")
+                st.rerun()
@@ -0,0 +1,64 @@
+"""Startup benchmark: time-to-first-render of app.py in fresh processes.
+
+Each sample starts a new Python interpreter with an empty working directory
+(fresh SQLite database), imports streamlit and renders the first page
+(login screen) through streamlit's AppTest runner.
+
+    python bench_startup.py --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+APP_PATH = Path(__file__).resolve().parent / "app.py"
+
+
+def child(app_path: str):
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    t1 = time.perf_counter()
+    at = AppTest.from_file(app_path, default_timeout=60)
+    at.run()
+    t2 = time.perf_counter()
+    if at.exception:
+        raise SystemExit(f"app raised: {at.exception[0].message}")
+    heavy = [m for m in ("pandas", "psycopg", "psycopg2") if m in sys.modules]
+    print(json.dumps({"import_streamlit": t1 - t0, "first_render": t2 - t1, "loaded": heavy}))
+
+
+def run_once(app_path: Path) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        out = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), "--child", str(app_path)],
+            cwd=tmp,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", metavar="APP", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        return
+
+    samples = [run_once(APP_PATH) for _ in range(args.runs)]
+    for key in ("import_streamlit", "first_render"):
+        vals = [s[key] * 1000 for s in samples]
+        print(f"{key:>16}: median {statistics.median(vals):8.1f} ms  min {min(vals):8.1f} ms  max {max(vals):8.1f} ms")
+    print(f"{'loaded':>16}: {', '.join(samples[-1]['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()